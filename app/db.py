@@ -6,9 +6,46 @@ import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")  # строка подключения Render
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# sync-эндпоинты FastAPI выполняются в threadpool (до 40 потоков),
+# дефолтный пул (5 + 10) заставлял их ждать соединение
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# соединения старше 30 минут пересоздаём заранее, а TCP keepalive не даёт
+# сети Render молча рвать простаивающие — иначе pre_ping ловит мёртвое
+# соединение и платит за новое прямо в запросе
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={
+        "keepalives": 1,
+        "keepalives_idle": 60,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    },
+)
+
+# expire_on_commit=False: после commit объекты не перечитываются из БД
+# при следующем обращении к атрибуту (сессия живёт один запрос)
+SessionLocal = sessionmaker(
+    bind=engine,
+    autoflush=False,
+    autocommit=False,
+    expire_on_commit=False,
+)
+
+# для эндпоинтов, которые только читают: AUTOCOMMIT убирает
+# BEGIN/ROLLBACK вокруг каждого запроса (пул общий с engine)
+ReadOnlySessionLocal = sessionmaker(
+    bind=engine.execution_options(isolation_level="AUTOCOMMIT"),
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 Base = declarative_base()
 
@@ -19,6 +56,14 @@ Base = declarative_base()
 
 def get_db():
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_db_readonly():
+    db = ReadOnlySessionLocal()
     try:
         yield db
     finally:
@@ -1,4 +1,12 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
 from fastapi import FastAPI
+from fastapi.responses import Response
 from app.routes.auth import router as auth_router
 from app.routes.system import router as system_router
 from app.routes.ai import router as ai_router
@@ -6,6 +14,33 @@ from app.routes.profile import router as profile_router
 from app.routes import billing
 from app.routes.billing_apple import router as billing_apple_router
 
+
+# --------------------------------------------------
+# ЛОГИ
+# запись в stdout идёт в отдельном потоке (QueueListener),
+# обработчик запроса только кладёт запись в очередь
+# --------------------------------------------------
+def setup_logging() -> None:
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    # по умолчанию как раньше — только WARNING и выше;
+    # INFO (billing, httpx/google) включается через LOG_LEVEL=INFO
+    root.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+
+
+setup_logging()
+
 app = FastAPI(title="Sarbaz API")
 
 app.include_router(auth_router)
@@ -17,16 +52,22 @@ app.include_router(billing_apple_router)
 
 
 # --------------------------------------------------
-# ROOT
+# ROOT / HEALTH
+# тела постоянные — сериализуем один раз; async, чтобы частые
+# пробы балансировщика не занимали поток из threadpool
 # --------------------------------------------------
+_ROOT_BODY = b'{"status":"ok"}'
+_HEALTH_BODY = b'{"status":"healthy"}'
+
+
 @app.get("/")
-def root():
-    return {"status": "ok"}
+async def root():
+    return Response(_ROOT_BODY, media_type="application/json")
 
 
 # --------------------------------------------------
 # HEALTH CHECK (для Render)
 # --------------------------------------------------
 @app.get("/health")
-def health():
-    return {"status": "healthy"}
\ No newline at end of file
+async def health():
+    return Response(_HEALTH_BODY, media_type="application/json")
\ No newline at end of file
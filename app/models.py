@@ -2,7 +2,7 @@
 # USERS SARBAZ
 # ==========================================================
 
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 
 from sqlalchemy import (
     Column,
@@ -13,6 +13,8 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     Date,
+    Index,
+    UniqueConstraint,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -20,6 +22,16 @@ from sqlalchemy.orm import relationship
 from .db import Base
 
 
+def premium_active(premium_until: datetime | None) -> bool:
+    """
+    Единое правило премиума: дата окончания задана и ещё не прошла.
+    Используется и моделью, и запросами по колонкам (GET /me).
+    """
+    if premium_until is None:
+        return False
+    return premium_until > datetime.now(timezone.utc)
+
+
 class UserSarbaz(Base):
     """
     Пользователи Sarbaz (Firebase social login).
@@ -49,17 +61,16 @@ class UserSarbaz(Base):
     # PREMIUM
     # =========================
 
-    # дата окончания премиума
-    premium_until = Column(DateTime, nullable=True)
+    # дата окончания премиума (всегда UTC, aware)
+    # требует migrations/0001_premium_until_tz.sql — выполнить ДО деплоя
+    premium_until = Column(DateTime(timezone=True), nullable=True)
 
     @property
     def is_premium(self) -> bool:
         """
         True если премиум ещё действует.
         """
-        if self.premium_until is None:
-            return False
-        return self.premium_until > datetime.utcnow()
+        return premium_active(self.premium_until)
 
     @property
     def premium_days_left(self) -> int:
@@ -68,7 +79,7 @@ class UserSarbaz(Base):
         """
         if not self.is_premium:
             return 0
-        delta = self.premium_until - datetime.utcnow()
+        delta = self.premium_until - datetime.now(timezone.utc)
         return max(delta.days, 0)
 
     # =========================
@@ -148,6 +159,10 @@ class UserSarbazSession(Base):
 
 class AIUsage(Base):
     __tablename__ = "ai_usage"
+    # одна запись на пользователя в день — на неё опирается upsert счётчика
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", name="uq_ai_usage_user_day"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -186,6 +201,18 @@ class AppPurchase(Base):
     """
 
     __tablename__ = "app_purchases"
+    # пересчёт премиума: max(expires_at) WHERE user_id = ? AND is_active
+    # AND expires_at > now (billing_apple, cron; billing.py — через
+    # ORDER BY expires_at DESC) — запрос закрывается одним индексом;
+    # в БД создаётся migrations/0003_app_purchases_user_active_expires.sql
+    __table_args__ = (
+        Index(
+            "ix_app_purchases_user_active_expires",
+            "user_id",
+            "is_active",
+            "expires_at",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
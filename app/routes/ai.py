@@ -1,3 +1,4 @@
+import logging
 import os
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -8,9 +9,12 @@ from openai import OpenAI
 from app.routes.auth import get_current_user
 from app.db import get_db
 from app.services.ai_limits import check_and_increment_usage
+from app.routing import ORJSONRoute
 
 
-router = APIRouter(prefix="/api/ai", tags=["AI"])
+router = APIRouter(prefix="/api/ai", tags=["AI"], route_class=ORJSONRoute)
+
+logger = logging.getLogger("ai")
 
 
 # ==========================================================
@@ -64,8 +68,10 @@ SYSTEM_PROMPT = """
 # ==========================================================
 # CHAT ENDPOINT
 # ==========================================================
+# обычный def: FastAPI выполняет его в threadpool, и блокирующие
+# вызовы БД / OpenAI (до 20 с) не останавливают event loop
 @router.post("/chat", response_model=ChatResponse)
-async def chat_ai(
+def chat_ai(
     data: ChatRequest,
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -137,7 +143,7 @@ async def chat_ai(
     # Любая ошибка OpenAI / сети / таймаута
     # ------------------------------------------------------
     except Exception as e:
-        print("AI ERROR:", repr(e))  # лог в Render
+        logger.error("AI ERROR → %r", e)  # лог в Render
 
         raise HTTPException(
             status_code=500,
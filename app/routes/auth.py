@@ -1,39 +1,76 @@
 # app/routes/auth.py (sarbaz-server)
 from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import bindparam, delete, func, select, update
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from jose import jwt
-from jose.exceptions import ExpiredSignatureError, JWTError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import jwt
 from datetime import datetime, timedelta
+from functools import lru_cache
 import os
-import json
+import base64
+import hmac
 import secrets
 import hashlib
 import logging
+import threading
+import time
+import orjson
 import firebase_admin
 from firebase_admin import auth, credentials
 
-from app.db import get_db
-from app.models import UserSarbaz, UserSarbazSession
+from app.db import get_db, get_db_readonly
+from app.models import UserSarbaz, UserSarbazSession, premium_active
+from app.routing import ORJSONRoute
 
 
-router = APIRouter(prefix="/api", tags=["Auth"])
+router = APIRouter(prefix="/api", tags=["Auth"], route_class=ORJSONRoute)
 
 logger = logging.getLogger("auth")
 
 
+# ==================================================
+# Schemas
+# ==================================================
+# тело разбирается и проверяется pydantic (ядро на Rust) за один проход;
+# поля опциональны, чтобы пустое значение по-прежнему давало 400, а не 422
+
+class SocialLoginRequest(BaseModel):
+    id_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str | None = None
+
+
 # ==================================================
 # Firebase init
 # ==================================================
 
-firebase_json = os.getenv("FIREBASE_CREDENTIALS")
-if not firebase_json:
-    raise RuntimeError("FIREBASE_CREDENTIALS is not set")
+# инициализируем при первом обращении, а не при импорте:
+# воркер стартует быстрее, /health не зависит от Firebase
+
+_firebase_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _init_firebase_app() -> firebase_admin.App:
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+
+    firebase_json = os.getenv("FIREBASE_CREDENTIALS")
+    if not firebase_json:
+        raise RuntimeError("FIREBASE_CREDENTIALS is not set")
 
-cred = credentials.Certificate(json.loads(firebase_json))
+    cred = credentials.Certificate(orjson.loads(firebase_json))
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+    return firebase_admin.initialize_app(cred)
+
+
+def get_firebase_app() -> firebase_admin.App:
+    with _firebase_lock:
+        return _init_firebase_app()
 
 
 # ==================================================
@@ -48,8 +85,23 @@ JWT_EXPIRE_MINUTES = 30
 REFRESH_EXPIRE_DAYS = 30
 
 
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# заголовок и ключ HS256 не меняются — готовим один раз,
+# на запрос остаётся только payload + один HMAC-SHA256
+_JWT_HEADER_B64 = _b64url(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+_JWT_KEY = JWT_SECRET.encode()
+
+# один экземпляр PyJWT на процесс; require отсекает токены
+# без sub/exp до остальных проверок
+_jwt = jwt.PyJWT()
+_JWT_DECODE_OPTIONS = {"require": ["exp", "sub"]}
+
+
 def create_access_token(uid: str) -> str:
-    exp = datetime.utcnow() + timedelta(minutes=JWT_EXPIRE_MINUTES)
+    exp = int(time.time()) + JWT_EXPIRE_MINUTES * 60
 
     payload = {
         "sub": uid,
@@ -57,13 +109,71 @@ def create_access_token(uid: str) -> str:
         "exp": exp,
     }
 
-    token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(orjson.dumps(payload))
+    signature = hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()
+
+    token = (signing_input + b"." + _b64url(signature)).decode()
 
-    logger.info(f"JWT CREATED → uid={uid}, exp={exp}")
+    logger.info("JWT CREATED → uid=%s, exp=%s", uid, exp)
 
     return token
 
 
+# ==================================================
+# User lookup
+# ==================================================
+
+# собирается один раз: SQLAlchemy берёт скомпилированный SQL из кеша,
+# поиск идёт по уникальному индексу ix_users_sarbaz_firebase_uid
+_USER_BY_UID = select(UserSarbaz).where(UserSarbaz.firebase_uid == bindparam("uid"))
+
+
+# UPDATE/INSERT ... RETURNING сразу отдают строку в сессию —
+# синхронизировать identity map отдельно не нужно
+_RETURNING_OPTIONS = {"synchronize_session": False, "populate_existing": True}
+
+
+def get_user_by_uid(db: Session, uid: str) -> UserSarbaz | None:
+    return db.execute(_USER_BY_UID, {"uid": uid}).scalar_one_or_none()
+
+
+# для /me нужны только поля ответа — берём строку-кортеж без
+# гидрации ORM-объекта и identity map
+_ME_BY_UID = select(
+    UserSarbaz.id,
+    UserSarbaz.email,
+    UserSarbaz.name,
+    UserSarbaz.premium_until,
+).where(UserSarbaz.firebase_uid == bindparam("uid"))
+
+
+# ==================================================
+# Response helpers
+# ==================================================
+# значения — только примитивы, поэтому кодируем orjson сразу в байты
+# и пропускаем обход словаря через jsonable_encoder
+
+def json_response(payload: dict) -> Response:
+    return Response(orjson.dumps(payload), media_type="application/json")
+
+
+# {"success": true} у logout/delete не меняется — кодируем один раз
+_SUCCESS_BODY = b'{"success":true}'
+
+
+def success_response() -> Response:
+    return Response(_SUCCESS_BODY, media_type="application/json")
+
+
+def user_payload(user: UserSarbaz) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "is_premium": user.is_premium,
+    }
+
+
 # ==================================================
 # Refresh helpers
 # ==================================================
@@ -80,6 +190,15 @@ def refresh_expiry() -> datetime:
     return datetime.utcnow() + timedelta(days=REFRESH_EXPIRE_DAYS)
 
 
+_SESSION_BY_HASH = select(UserSarbazSession).where(
+    UserSarbazSession.refresh_token_hash == bindparam("token_hash")
+)
+
+
+def get_session_by_hash(db: Session, token_hash: str) -> UserSarbazSession | None:
+    return db.execute(_SESSION_BY_HASH, {"token_hash": token_hash}).scalar_one_or_none()
+
+
 # ==================================================
 # AUTH HEADER (ГЛАВНОЕ ИСПРАВЛЕНИЕ)
 # ==================================================
@@ -96,57 +215,61 @@ def get_current_uid(authorization: str = Header(None)) -> str:
         raise HTTPException(401, "Authorization header missing")
 
     # --- неправильный формат ---
-    if not authorization.startswith("Bearer "):
-        logger.warning(f"AUTH: Invalid header format → {authorization}")
+    # один проход по строке: схема и токен сразу
+    scheme, _, token = authorization.partition(" ")
+    if scheme != "Bearer" or not token:
+        logger.warning("AUTH: Invalid header format → %s", authorization)
         raise HTTPException(401, "Invalid Authorization header")
 
-    token = authorization.split(" ", 1)[1]
-
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-
-        uid = payload.get("sub")
-        exp = payload.get("exp")
-
-        logger.info(
-            f"AUTH OK → uid={uid}, exp={exp}, now={datetime.utcnow().timestamp()}"
+        payload = _jwt.decode(
+            token, _JWT_KEY, algorithms=["HS256"], options=_JWT_DECODE_OPTIONS
         )
 
-        if not uid:
-            logger.warning("AUTH: UID missing in payload")
-            raise HTTPException(401, "Invalid token payload")
-
-        return uid
-
     # --- истёк ---
-    except ExpiredSignatureError:
+    except jwt.ExpiredSignatureError:
         logger.warning("AUTH: Token expired")
         raise HTTPException(401, "Token expired")
 
     # --- любой другой JWT косяк ---
-    except JWTError as e:
-        logger.warning(f"AUTH: Invalid token → {str(e)}")
+    except jwt.InvalidTokenError as e:
+        logger.warning("AUTH: Invalid token → %s", e)
         raise HTTPException(401, "Invalid token")
 
     # --- вообще неожиданный косяк ---
     except Exception as e:
-        logger.error(f"AUTH: Unexpected auth error → {str(e)}")
+        logger.error("AUTH: Unexpected auth error → %s", e)
         raise HTTPException(401, "Auth error")
 
+    uid = payload.get("sub")
+
+    # проверка вне try: иначе этот 401 глушился веткой "Auth error"
+    if not uid:
+        logger.warning("AUTH: UID missing in payload")
+        raise HTTPException(401, "Invalid token payload")
+
+    logger.debug(
+        "AUTH OK → uid=%s, exp=%s, now=%s", uid, payload.get("exp"), int(time.time())
+    )
+
+    return uid
+
 
 # ==================================================
 # POST /api/social-login
 # ==================================================
 
 @router.post("/social-login")
-def social_login(data: dict, db: Session = Depends(get_db)):
+def social_login(data: SocialLoginRequest, db: Session = Depends(get_db)):
 
-    id_token = data.get("id_token")
+    id_token = data.id_token
     if not id_token:
         raise HTTPException(400, "id_token required")
 
+    firebase_app = get_firebase_app()
+
     try:
-        decoded = auth.verify_id_token(id_token)
+        decoded = auth.verify_id_token(id_token, app=firebase_app)
     except Exception:
         raise HTTPException(401, "Invalid Firebase token")
 
@@ -155,27 +278,35 @@ def social_login(data: dict, db: Session = Depends(get_db)):
     name = decoded.get("name") or "User"
     provider = decoded.get("firebase", {}).get("sign_in_provider")
 
-    user = db.query(UserSarbaz).filter_by(firebase_uid=uid).first()
-
-    if not user:
-        user = UserSarbaz(
-            firebase_uid=uid,
-            email=email,
-            name=name,
-            provider=provider,
-            last_login_at=datetime.utcnow(),
-        )
-        db.add(user)
-
-        try:
-            db.commit()
-            db.refresh(user)
-        except IntegrityError:
-            db.rollback()
-            user = db.query(UserSarbaz).filter_by(firebase_uid=uid).first()
-
-    user.last_login_at = datetime.utcnow()
-    db.commit()
+    # обычный логин — один UPDATE ... RETURNING, время ставит БД;
+    # INSERT только при первом входе: он тратит значение sequence
+    # users_sarbaz.id даже при конфликте
+    user = db.scalars(
+        update(UserSarbaz)
+        .where(UserSarbaz.firebase_uid == uid)
+        .values(last_login_at=func.now())
+        .returning(UserSarbaz),
+        execution_options=_RETURNING_OPTIONS,
+    ).one_or_none()
+
+    if user is None:
+        # ON CONFLICT закрывает гонку двух первых логинов одного uid
+        user = db.scalars(
+            pg_insert(UserSarbaz)
+            .values(
+                firebase_uid=uid,
+                email=email,
+                name=name,
+                provider=provider,
+                last_login_at=func.now(),
+            )
+            .on_conflict_do_update(
+                index_elements=[UserSarbaz.firebase_uid],
+                set_={"last_login_at": func.now()},
+            )
+            .returning(UserSarbaz),
+            execution_options=_RETURNING_OPTIONS,
+        ).one()
 
     raw_refresh = generate_refresh_token()
 
@@ -186,21 +317,18 @@ def social_login(data: dict, db: Session = Depends(get_db)):
     )
 
     db.add(session)
+
+    # один commit на весь логин (раньше — три)
     db.commit()
 
     access_token = create_access_token(uid)
 
-    return {
+    return json_response({
         "success": True,
         "access_token": access_token,
         "refresh_token": raw_refresh,
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "is_premium": user.is_premium,
-        },
-    }
+        "user": user_payload(user),
+    })
 
 
 # ==================================================
@@ -208,25 +336,25 @@ def social_login(data: dict, db: Session = Depends(get_db)):
 # ==================================================
 
 @router.get("/me")
-def get_me(uid: str = Depends(get_current_uid), db: Session = Depends(get_db)):
-    user = db.query(UserSarbaz).filter_by(firebase_uid=uid).first()
+def get_me(uid: str = Depends(get_current_uid), db: Session = Depends(get_db_readonly)):
+    row = db.execute(_ME_BY_UID, {"uid": uid}).first()
 
-    if not user:
+    if not row:
         raise HTTPException(404, "User not found")
 
-    return {
-        "id": user.id,
-        "email": user.email,
-        "name": user.name,
-        "is_premium": user.is_premium,
-    }
+    return json_response({
+        "id": row.id,
+        "email": row.email,
+        "name": row.name,
+        "is_premium": premium_active(row.premium_until),
+    })
 
 
 def get_current_user(
     uid: str = Depends(get_current_uid),
     db: Session = Depends(get_db),
 ) -> UserSarbaz:
-    user = db.query(UserSarbaz).filter_by(firebase_uid=uid).first()
+    user = get_user_by_uid(db, uid)
 
     if not user:
         raise HTTPException(401, "User not found")
@@ -241,18 +369,14 @@ def get_current_user(
 # ==================================================
 
 @router.post("/auth/refresh")
-def refresh_token(data: dict, db: Session = Depends(get_db)):
-    raw_refresh = data.get("refresh_token")
+def refresh_token(data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    raw_refresh = data.refresh_token
     if not raw_refresh:
         raise HTTPException(400, "refresh_token required")
 
     token_hash = hash_token(raw_refresh)
 
-    session = (
-        db.query(UserSarbazSession)
-        .filter(UserSarbazSession.refresh_token_hash == token_hash)
-        .first()
-    )
+    session = get_session_by_hash(db, token_hash)
 
     if not session:
         raise HTTPException(401, "Invalid refresh token")
@@ -263,12 +387,12 @@ def refresh_token(data: dict, db: Session = Depends(get_db)):
     if session.expires_at < datetime.utcnow():
         raise HTTPException(401, "Refresh expired")
 
-    user = db.query(UserSarbaz).filter_by(id=session.user_id).first()
+    user = db.get(UserSarbaz, session.user_id)
     if not user:
         raise HTTPException(404, "User not found")
 
     # --- rotate refresh ---
-    session.revoked_at = datetime.utcnow()
+    session.revoked_at = func.now()
 
     new_refresh = generate_refresh_token()
 
@@ -283,10 +407,10 @@ def refresh_token(data: dict, db: Session = Depends(get_db)):
 
     new_access = create_access_token(user.firebase_uid)
 
-    return {
+    return json_response({
         "access_token": new_access,
         "refresh_token": new_refresh,
-    }
+    })
 
 
 # ==================================================
@@ -294,27 +418,26 @@ def refresh_token(data: dict, db: Session = Depends(get_db)):
 # ==================================================
 
 @router.post("/auth/logout")
-def logout(data: dict, db: Session = Depends(get_db)):
-    raw_refresh = data.get("refresh_token")
+def logout(data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    raw_refresh = data.refresh_token
     if not raw_refresh:
         raise HTTPException(400, "refresh_token required")
 
     token_hash = hash_token(raw_refresh)
 
-    session = (
-        db.query(UserSarbazSession)
-        .filter(UserSarbazSession.refresh_token_hash == token_hash)
-        .first()
+    # один UPDATE без загрузки сессии; уже отозванную не трогаем,
+    # отсутствующую молча пропускаем — logout должен быть идемпотентным
+    db.execute(
+        update(UserSarbazSession)
+        .where(
+            UserSarbazSession.refresh_token_hash == token_hash,
+            UserSarbazSession.revoked_at.is_(None),
+        )
+        .values(revoked_at=func.now())
     )
-
-    if not session:
-        # logout должен быть идемпотентным
-        return {"success": True}
-
-    session.revoked_at = datetime.utcnow()
     db.commit()
 
-    return {"success": True}
+    return success_response()
 
 # ==================================================
 # DELETE /api/me
@@ -334,20 +457,23 @@ def delete_me(
 
     uid = user.firebase_uid
 
+    # Core DELETE-ы в одной транзакции, без загрузки объектов и flush через ORM
+
     # --- удаляем все refresh-сессии ---
-    db.query(UserSarbazSession).filter(
-        UserSarbazSession.user_id == user.id
-    ).delete()
+    # явно: схема живёт вне репозитория, на CASCADE у FK не полагаемся
+    db.execute(
+        delete(UserSarbazSession).where(UserSarbazSession.user_id == user.id)
+    )
 
     # --- удаляем пользователя из БД ---
-    db.delete(user)
+    db.execute(delete(UserSarbaz).where(UserSarbaz.id == user.id))
     db.commit()
 
     # --- удаляем пользователя из Firebase ---
     try:
-        auth.delete_user(uid)
+        auth.delete_user(uid, app=get_firebase_app())
     except Exception as e:
         # Firebase может уже не иметь пользователя — это не критично
-        logger.warning(f"FIREBASE DELETE FAILED → {str(e)}")
+        logger.warning("FIREBASE DELETE FAILED → %s", e)
 
-    return {"success": True}
\ No newline at end of file
+    return success_response()
\ No newline at end of file
@@ -1,50 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-import os
-import json
 import requests
 
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
 from dateutil import parser as date_parser  # pip install python-dateutil
 
 from app.db import get_db
 from app.routes.auth import get_current_user
 from app.models import UserSarbaz, AppPurchase
+from app.services.google_play import PACKAGE_NAME, get_access_token
+from app.routing import ORJSONRoute
 
-router = APIRouter(prefix="/api/billing", tags=["Billing"])
-
-
-# ==========================================================
-# CONFIG
-# ==========================================================
-
-PACKAGE_NAME = "kz.sarbazinfo5000.app"
-
-
-# ==========================================================
-# GOOGLE ACCESS TOKEN
-# ==========================================================
-
-def get_access_token() -> str:
-    """
-    Получает OAuth access token для Google Play Developer API
-    из service account JSON, лежащего в ENV.
-    """
-    raw = os.getenv("GOOGLE_PLAY_SERVICE_JSON")
-    if not raw:
-        raise RuntimeError("GOOGLE_PLAY_SERVICE_JSON not set")
-
-    info = json.loads(raw)
-
-    creds = service_account.Credentials.from_service_account_info(
-        info,
-        scopes=["https://www.googleapis.com/auth/androidpublisher"],
-    )
-
-    creds.refresh(Request())
-    return creds.token
+router = APIRouter(prefix="/api/billing", tags=["Billing"], route_class=ORJSONRoute)
 
 
 # ==========================================================
@@ -65,87 +34,6 @@ def parse_google_datetime(dt_str: str | None) -> datetime | None:
         return None
 
 
-# ==========================================================
-# GOOGLE VERIFY (SUBSCRIPTIONS V2) — ИСПРАВЛЕННАЯ ВЕРСИЯ
-# ==========================================================
-
-def verify_google_subscription_v2(purchase_token: str):
-    """
-    Проверяет подписку через новый endpoint subscriptionsv2.
-    Возвращает:
-        is_active: bool           — есть ли право доступа (entitlement) сейчас
-        expiry: datetime | None   — самая поздняя дата окончания среди всех lineItems
-        product_id: str | None    — productId из первого активного или первого элемента
-        raw: dict                 — полный ответ от Google для отладки
-    """
-    access_token = get_access_token()
-
-    url = (
-        f"https://androidpublisher.googleapis.com/androidpublisher/v3/"
-        f"applications/{PACKAGE_NAME}/purchases/subscriptionsv2/tokens/{purchase_token}"
-    )
-
-    try:
-        r = requests.get(
-            url,
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=10,
-        )
-        r.raise_for_status()  # сразу кидает исключение при 4xx/5xx
-    except requests.RequestException as e:
-        raise HTTPException(502, f"Google verification request failed: {str(e)}")
-
-    payload = r.json()
-
-    line_items = payload.get("lineItems", [])
-    if not line_items:
-        return False, None, None, payload
-
-    now = datetime.now(timezone.utc)
-    max_expiry: datetime | None = None
-    is_entitled = False
-    selected_product_id: str | None = None
-
-    # subscriptionState обычно находится на верхнем уровне (SubscriptionPurchaseV2)
-    top_level_state = payload.get("subscriptionState", "UNKNOWN")
-
-    for item in line_items:
-        expiry = parse_google_datetime(item.get("expiryTime"))
-
-        # Обновляем максимальную дату истечения
-        if expiry and (max_expiry is None or expiry > max_expiry):
-            max_expiry = expiry
-
-        # Определяем, даёт ли этот item право доступа
-        # Используем top-level state, т.к. в subscriptionsv2 он основной
-        state = top_level_state
-
-        item_entitled = False
-
-        if state in [
-            "SUBSCRIPTION_STATE_ACTIVE",
-            "SUBSCRIPTION_STATE_IN_GRACE_PERIOD",
-        ]:
-            item_entitled = True
-        elif state == "SUBSCRIPTION_STATE_CANCELED" and expiry and expiry > now:
-            item_entitled = True
-        # paused, on_hold, expired, revoked → не даём доступ
-
-        if item_entitled:
-            is_entitled = True
-            if not selected_product_id:
-                selected_product_id = item.get("productId")
-
-    # Финальное решение: есть entitlement И срок действия не истёк
-    is_active = is_entitled and max_expiry is not None and max_expiry > now
-
-    # Если не нашли product_id среди активных — берём первый
-    if not selected_product_id and line_items:
-        selected_product_id = line_items[0].get("productId")
-
-    return is_active, max_expiry, selected_product_id, payload
-
-
 # ==========================================================
 # VERIFY ENDPOINT — DEBUG VERSION
 # ==========================================================
@@ -154,9 +42,15 @@ import logging
 logger = logging.getLogger("billing.verify")
 
 
+# тело разбирается pydantic за один проход; поле опционально,
+# чтобы пустой токен по-прежнему давал 400, а не 422
+class GoogleVerifyRequest(BaseModel):
+    purchaseToken: str | None = None
+
+
 @router.post("/verify")
 def verify_purchase(
-    data: dict,
+    data: GoogleVerifyRequest,
     user: UserSarbaz = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -171,7 +65,7 @@ def verify_purchase(
         # --------------------------------------------------
         # 0. Получаем purchaseToken
         # --------------------------------------------------
-        purchase_token = (data.get("purchaseToken") or "").strip()
+        purchase_token = (data.purchaseToken or "").strip()
 
         logger.info("VERIFY START user_id=%s", user.id)
         logger.info("TOKEN length=%s head=%s", len(purchase_token), purchase_token[:12])
@@ -244,11 +138,10 @@ def verify_purchase(
         # --------------------------------------------------
         # 5. UPSERT покупки
         # --------------------------------------------------
-        gp = (
-            db.query(AppPurchase)
-            .filter(AppPurchase.purchase_token == purchase_token)
-            .first()
-        )
+        # purchase_token уникален → поиск по unique-индексу, максимум одна строка
+        gp = db.execute(
+            select(AppPurchase).where(AppPurchase.purchase_token == purchase_token)
+        ).scalar_one_or_none()
 
         if not gp:
             logger.info("Creating new AppPurchase record")
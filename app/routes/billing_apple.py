@@ -12,13 +12,15 @@ from cryptography import x509
 from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.models import UserSarbaz, AppPurchase
 from app.routes.auth import get_current_user
+from app.routing import ORJSONRoute
 
-router = APIRouter(prefix="/api/billing", tags=["Billing"])
+router = APIRouter(prefix="/api/billing", tags=["Billing"], route_class=ORJSONRoute)
 log = logging.getLogger("billing.apple")
 
 # =========================
@@ -115,6 +117,22 @@ def _looks_like_jws(s: str) -> bool:
     return len(parts) == 3 and all(p.strip() for p in parts)
 
 
+def _unverified_claims(jws: str) -> dict[str, Any]:
+    """
+    Payload БЕЗ проверки подписи — только для дешёвого раннего отказа.
+    Доверять ему можно лишь после _decode_and_verify_storekit2_jws.
+    """
+    try:
+        claims = jwt.decode(jws, options={"verify_signature": False})
+    except Exception as e:
+        raise ValueError(f"Invalid JWS payload: {e}")
+
+    if not isinstance(claims, dict):
+        raise ValueError("Payload is not dict")
+
+    return claims
+
+
 def _decode_and_verify_storekit2_jws(jws: str) -> dict[str, Any]:
     try:
         header = jwt.get_unverified_header(jws)
@@ -188,14 +206,6 @@ def _extract_purchase_token(req: AppleVerifyRequest, payload: dict[str, Any]) ->
     return candidate or None
 
 
-def _as_utc(dt: datetime | None) -> datetime | None:
-    if dt is None:
-        return None
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
 # =========================================================
 # ENDPOINT
 # =========================================================
@@ -216,20 +226,28 @@ def verify_apple(
         return {"is_premium": False, "premium_until": None}
 
     try:
-        payload = _decode_and_verify_storekit2_jws(jws)
+        claims = _unverified_claims(jws)
     except Exception as e:
-        log.warning("Apple SK2 verify failed: %s", str(e))
+        log.warning("Apple SK2 decode failed: %s", str(e))
         return {"is_premium": False, "premium_until": None}
 
     # =============================
     # SECURITY CHECKS
+    # (до криптографии: чужой JWS не тратит ECDSA;
+    #  подпись этих же claims проверяется ниже)
     # =============================
-    if payload.get("bundleId") != BUNDLE_ID_EXPECTED:
-        log.error("Bundle mismatch: %s", payload.get("bundleId"))
+    if claims.get("bundleId") != BUNDLE_ID_EXPECTED:
+        log.error("Bundle mismatch: %s", claims.get("bundleId"))
         return {"is_premium": False, "premium_until": None}
 
-    if payload.get("productId") != product_id:
-        log.warning("Product mismatch payload=%s req=%s", payload.get("productId"), product_id)
+    if claims.get("productId") != product_id:
+        log.warning("Product mismatch payload=%s req=%s", claims.get("productId"), product_id)
+        return {"is_premium": False, "premium_until": None}
+
+    try:
+        payload = _decode_and_verify_storekit2_jws(jws)
+    except Exception as e:
+        log.warning("Apple SK2 verify failed: %s", str(e))
         return {"is_premium": False, "premium_until": None}
 
     # =============================
@@ -250,11 +268,10 @@ def verify_apple(
         log.error("Apple transactionId/originalTransactionId missing")
         return {"is_premium": False, "premium_until": None}
 
-    ap = (
-        db.query(AppPurchase)
-        .filter(AppPurchase.purchase_token == purchase_token)
-        .first()
-    )
+    # purchase_token уникален → поиск по unique-индексу, максимум одна строка
+    ap = db.execute(
+        select(AppPurchase).where(AppPurchase.purchase_token == purchase_token)
+    ).scalar_one_or_none()
 
     if not ap:
         ap = AppPurchase(
@@ -277,26 +294,30 @@ def verify_apple(
     # ПЕРЕСЧЁТ premium_until У USER
     # (единая логика как в Google)
     # =============================
-    other_active = (
-        db.query(AppPurchase)
-        .filter(
+    db.flush()
+
+    latest_active = (
+        select(func.max(AppPurchase.expires_at))
+        .where(
             AppPurchase.user_id == user.id,
             AppPurchase.is_active == True,
             AppPurchase.expires_at > now,
         )
-        .order_by(AppPurchase.expires_at.desc())
-        .first()
+        .scalar_subquery()
     )
 
-    user.premium_until = _as_utc(other_active.expires_at) if other_active else None
-
-    db.add(user)
+    # один UPDATE ... RETURNING вместо ORM flush + refresh
+    user_premium_until = db.execute(
+        update(UserSarbaz)
+        .where(UserSarbaz.id == user.id)
+        .values(premium_until=latest_active)
+        .returning(UserSarbaz.premium_until)
+    ).scalar_one()
     db.commit()
-    db.refresh(user)
 
-    is_premium = bool(user.premium_until and _as_utc(user.premium_until) > now)
+    is_premium = bool(user_premium_until and user_premium_until > now)
 
     return {
         "is_premium": is_premium,
-        "premium_until": user.premium_until.isoformat() if user.premium_until else None,
-    }
\ No newline at end of file
+        "premium_until": user_premium_until,
+    }
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.db import get_db
 from app.routes.auth import get_current_user
 from app.schemas.profile import ProfileResponse, PremiumInfo, AIStats
 from app.services.ai_profile import get_ai_stats
 from app.models import UserSarbaz
+from app.routing import ORJSONRoute
 
-router = APIRouter(prefix="/api", tags=["Profile"])
+router = APIRouter(prefix="/api", tags=["Profile"], route_class=ORJSONRoute)
 
 
 @router.get("/profile", response_model=ProfileResponse)
@@ -24,10 +25,9 @@ def get_profile(
     # 1. FAST PREMIUM SYNC (защита от просроченного premium)
     # ======================================================
 
-    if user.premium_until and user.premium_until <= datetime.utcnow():
+    if user.premium_until and user.premium_until <= datetime.now(timezone.utc):
         user.premium_until = None
         db.commit()
-        db.refresh(user)
 
     # ======================================================
     # 2. PREMIUM
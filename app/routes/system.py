@@ -1,20 +1,14 @@
-from fastapi import APIRouter, Query
-from app.config.app_config import get_app_config
-
-router = APIRouter(prefix="/api", tags=["System"])
+import hashlib
 
+import orjson
+from fastapi import APIRouter, Header, Query, Response
+from app.config.app_config import get_app_config
+from app.routing import ORJSONRoute
 
-@router.get("/app-version")
-def get_app_version(platform: str = Query("android")):
-    """
-    Универсальная проверка версии приложения.
-    Работает со старыми клиентами.
-    """
-
-    config = get_app_config()
+router = APIRouter(prefix="/api", tags=["System"], route_class=ORJSONRoute)
 
-    cfg = config.get(platform.lower(), config["android"])
 
+def _build_response(cfg: dict) -> dict:
     return {
         # --- новый формат ---
         "latest_version": cfg["latest_version"],
@@ -29,4 +23,57 @@ def get_app_version(platform: str = Query("android")):
         "latestBuild": cfg["latest_build"],
         "minSupportedVersion": cfg["min_supported_version"],
         "minSupportedBuild": cfg["min_supported_build"],
-    }
\ No newline at end of file
+    }
+
+
+def _render(cfg: dict) -> tuple[bytes, str]:
+    body = orjson.dumps(_build_response(cfg))
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    return body, etag
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match — список через запятую или "*"; сравнение слабое,
+    # поэтому префикс W/ (его ставят прокси при сжатии) отбрасываем
+    if not if_none_match:
+        return False
+
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+
+    return False
+
+
+# ответы (JSON + ETag) собираем один раз при старте —
+# конфиг не меняется без деплоя
+_PLATFORM_RESPONSES: dict[str, tuple[bytes, str]] = {
+    platform: _render(cfg) for platform, cfg in get_app_config().items()
+}
+
+
+@router.get("/app-version")
+async def get_app_version(
+    platform: str = Query("android"),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Универсальная проверка версии приложения.
+    Работает со старыми клиентами.
+    """
+
+    body, etag = _PLATFORM_RESPONSES.get(platform.lower(), _PLATFORM_RESPONSES["android"])
+
+    # прокси/CDN могут отдавать ответ минуту без обращения к нам
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+
+    # клиент уже видел этот конфиг → 304 без тела
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,6 +1,6 @@
 from datetime import date
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 
 from app.models import AIUsage
 
@@ -23,31 +23,29 @@ def check_and_increment_usage(db: Session, user):
 
     today = date.today()
 
-    # ===== берём запись С БЛОКИРОВКОЙ =====
-    usage = (
-        db.execute(
-            select(AIUsage)
-            .where(AIUsage.user_id == user.id, AIUsage.day == today)
-            .with_for_update()
+    # ===== один INSERT ... ON CONFLICT вместо SELECT FOR UPDATE + UPDATE =====
+    # нет записи → создаётся с count=1
+    # есть и лимит не достигнут → count + 1
+    # лимит достигнут → WHERE не проходит, RETURNING пустой
+    stmt = (
+        insert(AIUsage)
+        .values(user_id=user.id, day=today, count=1)
+        .on_conflict_do_update(
+            # уникальность (user_id, day): migrations/0002_ai_usage_unique_user_day.sql
+            index_elements=[AIUsage.user_id, AIUsage.day],
+            set_={"count": AIUsage.count + 1},
+            where=AIUsage.count < FREE_LIMIT,
         )
-        .scalar_one_or_none()
+        .returning(AIUsage.count)
     )
 
-    # ===== если записи нет — создаём =====
-    if not usage:
-        usage = AIUsage(user_id=user.id, day=today, count=0)
-        db.add(usage)
-        db.flush()  # без commit, просто получаем объект
+    count = db.execute(stmt).scalar_one_or_none()
+    db.commit()
 
     # ===== лимит достигнут =====
-    if usage.count >= FREE_LIMIT:
-        db.commit()
+    if count is None:
         return False, 0, False
 
-    # ===== увеличиваем счётчик =====
-    usage.count += 1
-    db.commit()
-
-    remaining = max(FREE_LIMIT - usage.count, 0)
+    remaining = max(FREE_LIMIT - count, 0)
 
-    return True, remaining, False
\ No newline at end of file
+    return True, remaining, False
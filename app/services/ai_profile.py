@@ -1,9 +1,9 @@
 from datetime import date
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.models import AIUsage, UserSarbaz
-
-FREE_LIMIT = 5
+from app.services.ai_limits import FREE_LIMIT
 
 
 def get_ai_stats(db: Session, user: UserSarbaz):
@@ -13,14 +13,17 @@ def get_ai_stats(db: Session, user: UserSarbaz):
 
     today = date.today()
 
-    usage = (
-        db.query(AIUsage)
-        .filter(AIUsage.user_id == user.id, AIUsage.day == today)
-        .first()
+    # нужен только счётчик — без загрузки ORM-объекта AIUsage
+    used = (
+        db.execute(
+            select(AIUsage.count)
+            .where(AIUsage.user_id == user.id, AIUsage.day == today)
+            .limit(1)
+        )
+        .scalar()
+        or 0
     )
 
-    used = usage.count if usage else 0
-
     # Премиум → без лимита, но статистику НЕ теряем
     if user.is_premium:
         return {
@@ -1,41 +1,17 @@
-import os
-import json
 import requests
-from datetime import datetime
+from datetime import datetime, timezone
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
-
 from app.db import SessionLocal
 from app.models import AppPurchase, UserSarbaz
+from app.services.google_play import PACKAGE_NAME, get_access_token
 
 
-PACKAGE_NAME = "kz.sarbazinfo5000.app"
 SUB_ID = "sarbaz_premium_monthly"
 
 
-# ==========================================================
-# GOOGLE ACCESS TOKEN
-# ==========================================================
-
-def get_access_token() -> str:
-    raw = os.getenv("GOOGLE_PLAY_SERVICE_JSON")
-    if not raw:
-        raise RuntimeError("GOOGLE_PLAY_SERVICE_JSON not set")
-
-    info = json.loads(raw)
-
-    creds = service_account.Credentials.from_service_account_info(
-        info,
-        scopes=["https://www.googleapis.com/auth/androidpublisher"],
-    )
-
-    creds.refresh(Request())
-    return creds.token
-
-
 # ==========================================================
 # VERIFY ONE SUBSCRIPTION
 # ==========================================================
@@ -62,7 +38,7 @@ def verify_purchase_google(purchase_token: str) -> datetime | None:
     payload = r.json()
     expiry_ms = int(payload["expiryTimeMillis"])
 
-    return datetime.utcfromtimestamp(expiry_ms / 1000)
+    return datetime.fromtimestamp(expiry_ms / 1000, tz=timezone.utc)
 
 
 # ==========================================================
@@ -77,7 +53,7 @@ def sync_premium_once() -> None:
     db: Session = SessionLocal()
 
     try:
-        now = datetime.utcnow()
+        now = datetime.now(timezone.utc)
 
         purchases = (
             db.query(AppPurchase)
@@ -85,6 +61,25 @@ def sync_premium_once() -> None:
             .all()
         )
 
+        # user_id -> самая поздняя дата среди активных покупок в БД
+        # (состояние до этого прогона, autoflush выключен). Берём из БД,
+        # а не из purchases: там и Apple/OSA-покупки, и токены, на которые
+        # Google ответил ошибкой, — по ним premium снимать нельзя
+        active_map: dict[int, datetime] = dict(
+            db.query(AppPurchase.user_id, func.max(AppPurchase.expires_at))
+            .filter(
+                AppPurchase.is_active == True,
+                AppPurchase.expires_at > now,
+            )
+            .group_by(AppPurchase.user_id)
+            .all()
+        )
+
+        # user_id -> самая поздняя подтверждённая Google дата в этом прогоне
+        verified_map: dict[int, datetime] = {}
+        # пользователи, у которых в этом прогоне отключилась покупка
+        deactivated: set[int] = set()
+
         for purchase in purchases:
             expiry = verify_purchase_google(purchase.purchase_token)
 
@@ -92,31 +87,36 @@ def sync_premium_once() -> None:
             if not expiry or expiry <= now:
                 purchase.is_active = False
                 purchase.expires_at = expiry
+                deactivated.add(purchase.user_id)
             else:
                 purchase.expires_at = expiry
                 purchase.is_active = True
 
-            # ---------- обновляем пользователя ----------
-            user = db.get(UserSarbaz, purchase.user_id)
-            if not user:
-                continue
+                current = verified_map.get(purchase.user_id)
+                if current is None or expiry > current:
+                    verified_map[purchase.user_id] = expiry
 
-            if purchase.is_active:
-                if not user.premium_until or expiry > user.premium_until:
-                    user.premium_until = expiry
-            else:
-                active_other = (
-                    db.query(AppPurchase)
-                    .filter(
-                        AppPurchase.user_id == user.id,
-                        AppPurchase.is_active == True,
-                        AppPurchase.expires_at > now,
-                    )
-                    .first()
-                )
-
-                if not active_other:
-                    user.premium_until = None
+        # ---------- обновляем пользователей (одним запросом) ----------
+        user_ids = verified_map.keys() | deactivated
+
+        users = (
+            db.query(UserSarbaz)
+            .filter(UserSarbaz.id.in_(user_ids))
+            .all()
+            if user_ids
+            else []
+        )
+
+        for user in users:
+            latest = verified_map.get(user.id)
+
+            if latest:
+                if not user.premium_until or latest > user.premium_until:
+                    user.premium_until = latest
+            elif user.id not in active_map:
+                # как раньше с active_other: снимаем premium, только если
+                # в БД у пользователя нет другой активной покупки
+                user.premium_until = None
 
         db.commit()
 
@@ -0,0 +1,48 @@
+import os
+import json
+import threading
+from functools import lru_cache
+
+from google.oauth2 import service_account
+from google.auth.transport.requests import Request
+
+
+PACKAGE_NAME = "kz.sarbazinfo5000.app"
+
+
+# ==========================================================
+# GOOGLE ACCESS TOKEN (кешируется на время жизни токена)
+# ==========================================================
+
+SCOPES = ["https://www.googleapis.com/auth/androidpublisher"]
+
+_refresh_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_credentials() -> service_account.Credentials:
+    raw = os.getenv("GOOGLE_PLAY_SERVICE_JSON")
+    if not raw:
+        raise RuntimeError("GOOGLE_PLAY_SERVICE_JSON not set")
+
+    info = json.loads(raw)
+
+    return service_account.Credentials.from_service_account_info(
+        info,
+        scopes=SCOPES,
+    )
+
+
+def get_access_token() -> str:
+    """
+    OAuth access token для Google Play Developer API.
+
+    Токен живёт ~1 час: ходим в Google за новым только когда
+    текущий истёк, а не на каждую проверку покупки.
+    """
+    creds = _get_credentials()
+
+    with _refresh_lock:
+        if not creds.valid:
+            creds.refresh(Request())
+        return creds.token
@@ -0,0 +1,23 @@
+# Конфиг gunicorn (подхватывается автоматически из корня проекта)
+# запуск: gunicorn app.main:app
+
+import os
+
+# ASGI-воркеры uvicorn (uvloop + httptools), а не sync-воркеры WSGI;
+# uvicorn.workers устарел с uvicorn 0.30 — воркер в пакете uvicorn-worker
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# не cpu_count(): в контейнере это ядра хоста, а каждый воркер держит
+# до DB_POOL_SIZE + DB_MAX_OVERFLOW соединений к общей с OSA БД
+# и свою копию firebase/openai/google — поднимать через WEB_CONCURRENCY
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# периодически перезапускаем воркер (с разбросом, чтобы не все разом) —
+# отпускает накопленную память; пул БД на воркер: DB_POOL_SIZE + DB_MAX_OVERFLOW
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+# даём текущим запросам (в т.ч. к OpenAI) завершиться при деплое
+graceful_timeout = 30
@@ -0,0 +1,29 @@
+-- premium_until: TIMESTAMP (наивный UTC) -> TIMESTAMPTZ
+--
+-- ПОРЯДОК ДЕПЛОЯ: выполнить ДО выкладки кода, где
+-- UserSarbaz.premium_until = DateTime(timezone=True).
+-- Иначе psycopg2 вернёт наивные datetime и сравнение с
+-- datetime.now(timezone.utc) упадёт с TypeError (500 у всех с premium).
+--
+-- Запуск: psql "$DATABASE_URL" -f migrations/0001_premium_until_tz.sql
+-- Повторный запуск безопасен.
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'users_sarbaz'
+          AND column_name = 'premium_until'
+          AND data_type = 'timestamp without time zone'
+    ) THEN
+        ALTER TABLE users_sarbaz
+            ALTER COLUMN premium_until TYPE TIMESTAMPTZ
+            USING premium_until AT TIME ZONE 'UTC';
+    END IF;
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,51 @@
+-- ai_usage: одна запись на (user_id, day) — на неё опирается
+-- INSERT ... ON CONFLICT (user_id, day) в check_and_increment_usage
+--
+-- ПОРЯДОК ДЕПЛОЯ: выполнить ДО выкладки кода с upsert-счётчиком.
+-- Без уникального индекса ON CONFLICT падает, и /api/ai/chat
+-- отдаёт 500 всем без premium.
+--
+-- Старый SELECT ... FOR UPDATE не мог заблокировать ещё не созданную
+-- строку, поэтому дубли за один день возможны: схлопываем их в самую
+-- раннюю запись, суммируя count.
+--
+-- Запуск: psql "$DATABASE_URL" -f migrations/0002_ai_usage_unique_user_day.sql
+-- Повторный запуск безопасен.
+
+BEGIN;
+
+LOCK TABLE ai_usage IN SHARE ROW EXCLUSIVE MODE;
+
+WITH dup AS (
+    SELECT
+        user_id,
+        day,
+        min(id) AS keep_id,
+        sum(count) AS total
+    FROM ai_usage
+    GROUP BY user_id, day
+    HAVING count(*) > 1
+)
+UPDATE ai_usage AS a
+SET count = dup.total
+FROM dup
+WHERE a.id = dup.keep_id;
+
+DELETE FROM ai_usage AS a
+USING ai_usage AS b
+WHERE a.user_id = b.user_id
+  AND a.day = b.day
+  AND a.id > b.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_ai_usage_user_day'
+    ) THEN
+        ALTER TABLE ai_usage
+            ADD CONSTRAINT uq_ai_usage_user_day UNIQUE (user_id, day);
+    END IF;
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- app_purchases: составной индекс для пересчёта premium —
+-- max(expires_at) WHERE user_id = ? AND is_active AND expires_at > now
+-- (billing_apple, billing_sync_cron; billing.py — ORDER BY expires_at DESC)
+--
+-- ПОРЯДОК ДЕПЛОЯ: можно выполнять до или после выкладки кода —
+-- без индекса запросы работают, только медленнее.
+-- Таблица общая с OSA, поэтому CONCURRENTLY: без блокировки записи.
+-- CONCURRENTLY нельзя выполнять в транзакции — файл без BEGIN/COMMIT.
+--
+-- Запуск: psql "$DATABASE_URL" -f migrations/0003_app_purchases_user_active_expires.sql
+-- Повторный запуск безопасен.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_app_purchases_user_active_expires
+    ON app_purchases (user_id, is_active, expires_at);